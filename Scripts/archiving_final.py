@@ -2,13 +2,17 @@
 # Import required libraries
 # =========================================
 import argparse  # For parsing command-line arguments
-import json
+import orjson  # Fast JSON parsing and pretty-printing
 import os  # For accessing environment variables and file paths
 import requests.exceptions  # To handle HTTP request exceptions
-from datetime import datetime, timedelta  # For working with dates and time windows
-import pandas as pd  # For handling tabular data
-from dotenv import load_dotenv  # For loading environment variables from a .env file
-from thoughtspot_rest_api_v1 import *  # Import all functions from the ThoughtSpot API wrapper
+from concurrent.futures import ThreadPoolExecutor, as_completed  # For issuing independent API calls concurrently
+from itertools import chain  # For flattening dependents of all models
+import time  # For computing the age cutoff
+import pyarrow as pa  # For the fixed Parquet archive schema
+from ts_client import (  # Shared ThoughtSpot helpers
+    DEPENDENTS_BATCH_SIZE, IMPRESSIONS_BATCH_SIZE, TML_EXPORT_BATCH_SIZE, authenticate, cached_call, chunked, export_tml_with_associated,
+    get_all_models, get_dependents_bulk, search_impressions_cached, tml_has_alert, with_created_dt
+)
 
 # =========================================
 # Parse command-line arguments
@@ -18,59 +22,36 @@ parser.add_argument('--days', type=int, default=90, help='Minimum model age in d
 parser.add_argument('--lookback-days', type=int, default=90, help='How far back to look for impressions (default: 90)')  # Argument for impression window
 parser.add_argument('--imp-threshold', type=int, default=1, help='Max allowed impressions (default: 1)')  # Argument for impression threshold
 parser.add_argument('--env-file', type=str, default='.env', help='Path to .env file')  # Argument for path to .env file
+parser.add_argument('--cache-ttl', type=int, default=300, help='Seconds to reuse cached API responses, 0 disables (default: 300)')  # Argument for response cache lifetime
+parser.add_argument('--max-rate', type=float, default=40, help='Max API requests per second, 0 disables (default: 40)')  # Argument for request rate limit
+parser.add_argument('--max-workers', type=int, default=10, help='Max concurrent API calls per step (default: 10)')  # Argument for request concurrency
+parser.add_argument('--archive-dir', type=str, default=None, help='Directory to append models ready for archiving to as Parquet (default: off)')  # Argument for archive output
 args = parser.parse_args()  # Parse the arguments and store them in a variable
 
 # =========================================
-# Load environment variables
+# Authenticate with ThoughtSpot
 # =========================================
-load_dotenv(dotenv_path=args.env_file)  # Load environment variables from the given .env file
-USERNAME = os.getenv('TS_USERNAME')  # Get the ThoughtSpot username
-PASSWORD = os.getenv('TS_PASSWORD')  # Get the ThoughtSpot password
-SERVER_URL = os.getenv('TS_SERVER_URL')  # Get the ThoughtSpot server URL
+ts = authenticate(args.env_file, max_rate=args.max_rate, max_workers=args.max_workers, required_env=('TS_LOGICAL_TABLE_ID',))  # Load .env and get an authenticated client
 LOGICAL_TABLE_ID = os.getenv('TS_LOGICAL_TABLE_ID')  # Get the GUID for the logical table used in queries
 SAMPLE_GUID = os.getenv('TS_SAMPLE_GUID')  # Get the GUID for the hardcoded sample export (Step 9)
 
-# =========================================
-# Authenticate with ThoughtSpot
-# =========================================
-ts = TSRestApiV2(server_url=SERVER_URL)  # Create a ThoughtSpot API client instance
-try:
-    token = ts.auth_token_full(username=USERNAME, password=PASSWORD, validity_time_in_sec=3600)  # Authenticate and get token
-    ts.bearer_token = token['token']  # Set the bearer token for future requests
-except requests.exceptions.HTTPError as e:  # If authentication fails...
-    print("Authentication failed:", e.response.content)  # Print error message
-    exit(1)  # Exit the script
+executor = ThreadPoolExecutor(max_workers=args.max_workers)  # Shared worker pool for per-GUID API calls
 
 # =========================================
 # Step 1: Fetch all models
 # =========================================
-def get_all_models():
-    request = {
-        'metadata': [{'type': 'LOGICAL_TABLE'}],  # Request all logical table metadata
-        'include_details': True,  # Include detailed metadata
-        'record_offset': 0,  # Start from the first record
-        'record_size': 100000  # Set a large record size to fetch all
-    }
-    result = ts.metadata_search(request=request)  # Send the metadata search request
-    rows = []  # List to store model info
-    for model in result:  # Loop through each returned model
-        meta = model.get('metadata_header', {})  # Get metadata header
-        rows.append({
-            'Model_ID': meta.get('id'),  # Store model GUID
-            'Name': meta.get('name'),  # Store model name
-            'Author': meta.get('authorDisplayName'),  # Store model author's name
-            'Created_ms': meta.get('created')  # Store model creation time in milliseconds
-        })
-    df = pd.DataFrame(rows)  # Convert to DataFrame
-    df['Created_dt'] = pd.to_datetime(df['Created_ms'], unit='ms', errors='coerce')  # Convert ms to datetime
-    return df  # Return the DataFrame
+# See get_all_models in ts_client.py
 
 # =========================================
 # Step 2: Filter models older than N days
 # =========================================
-def filter_old_models(df, min_age_days):
-    cutoff = datetime.now() - timedelta(days=min_age_days)  # Calculate the cutoff datetime
-    return df[df['Created_dt'] < cutoff].copy()  # Filter models created before the cutoff
+def age_cutoff_ms(min_age_days):
+    return time.time_ns() // 1_000_000 - min_age_days * 86_400_000  # Calculate the cutoff in epoch ms with integer math
+
+
+def filter_old_models(df, cutoff_ms):
+    created = df['Created_ms'].to_numpy(dtype='int64', na_value=cutoff_ms)  # Missing timestamps never count as old
+    return df.iloc[created < cutoff_ms]  # Filter models created before the cutoff; later steps only use assign, so no copy
 
 
 # Step 3: Check for any real response on survey model
@@ -80,80 +61,116 @@ def filter_old_models(df, min_age_days):
 
 
 # =========================================
-# Step 4: Fetch dependent object GUIDs for a model
+# Step 4: Fetch dependent object GUIDs for a batch of models
 # =========================================
-def get_dependents(model_id):
-    request = {
-        'metadata': [{'type': 'LOGICAL_TABLE', 'identifier': model_id}],  # Specify model ID
-        'include_dependent_objects': True,  # Include dependent objects
-        'include_headers': True,  # Include headers
-        'record_offset': 0,
-        'record_size': 1
-    }
-    res = ts.metadata_search(request=request)  # Make the request
-    if not res:  # If nothing returned
-        return []
-    dependents = res[0].get('dependent_objects', {}).get(model_id, {})  # Extract dependents
-    return [obj['id'] for lst in dependents.values() for obj in lst]  # Flatten and return GUID list
+# See get_dependents_bulk in ts_client.py
 
 # =========================================
 # Step 5: Get total impressions for dependents
 # =========================================
-def get_total_impressions(dependents, days_window):
-    total = 0  # Initialize total
-    for guid in dependents:  # Loop through dependent GUIDs
-        query_string = (
-            f"[Answer Book GUID] = '{guid}' "
-            f"count [Impressions] [Timestamp].'last {days_window} days' max [Timestamp]"
-        )  # Build search query
-        request = {
-            'query_string': query_string,
-            'logical_table_identifier': LOGICAL_TABLE_ID,  # Use the impressions table
-            'data_format': 'COMPACT',
-            'record_offset': 0,
-            'record_size': 1
-        }
-        try:
-            result = ts.searchdata(request=request)  # Execute the query
-            contents = result.get('contents', [])  # Get result contents
-            if contents and contents[0].get('data_rows'):  # If data exists
-                idx = contents[0]['column_names'].index('Number of Impressions')  # Get index of impressions column
-                total += contents[0]['data_rows'][0][idx]  # Add impressions
-        except Exception as e:
-            print(f"[Impression Fetch Failed] {guid}: {e}")  # Log failure
-            total += args.imp_threshold  # Assume max to avoid deletion risk
-    return total  # Return total impressions
+def get_impressions_for_batch(guids, days_window):
+    try:
+        return search_impressions_cached(ts, guids, days_window, LOGICAL_TABLE_ID, args.cache_ttl)  # One grouped query for the uncached part of the batch
+    except Exception as e:
+        print(f"[Impression Fetch Failed] {len(guids)} GUIDs: {e}")  # Log failure
+        return dict.fromkeys(guids, args.imp_threshold)  # Assume max to avoid deletion risk
+
+
+def get_dependents_and_impressions(model_ids, days_window):
+    dependents_by_model = {}  # Only models the server resolved get an entry
+    queued_guids = set()  # Dependents whose impressions are already being fetched
+    impression_futures = []
+    dependent_futures = [
+        executor.submit(get_dependents_bulk, ts, batch, cache_ttl=args.cache_ttl)
+        for batch in chunked(model_ids, DEPENDENTS_BATCH_SIZE)
+    ]  # Fetch dependent batches concurrently
+    for future in as_completed(dependent_futures):
+        new_guids = set()
+        for model_id, headers in future.result().items():
+            dependents_by_model[model_id] = [obj['id'] for obj in headers]  # Flatten to GUID list
+            new_guids.update(dependents_by_model[model_id])
+        new_guids -= queued_guids  # Query each unique GUID once
+        queued_guids |= new_guids
+        for batch in chunked(new_guids, IMPRESSIONS_BATCH_SIZE):
+            impression_futures.append(executor.submit(get_impressions_for_batch, batch, days_window))  # Start impressions while other dependents load
+    impressions_by_guid = {}
+    for future in impression_futures:
+        impressions_by_guid.update(future.result())
+    return dependents_by_model, impressions_by_guid  # Return ({resolved model GUID: [dependent GUIDs]}, {dependent GUID: impressions})
+
+
+def get_total_impressions(dependents, impressions_by_guid):
+    return sum(impressions_by_guid.get(guid, 0) for guid in dependents)  # Return total impressions
 
 # =========================================
 # Step 6: Check for alerts in dependent TMLs
 # =========================================
-def check_alerts_on_dependents(row):
-    for guid in row['Dependent_GUIDs']:  # Loop through all dependents
-        try:
-            payload = {
-                "metadata": [{"identifier": guid}],
-                "export_associated": True,
-                "export_fqn": False,
-                "edoc_format": "JSON",
-                "export_schema_version": "DEFAULT",
-                "export_dependent": False,
-                "export_connection_as_dependent": False,
-                "all_orgs_override": False
-            }
-            res = ts.post_request("/metadata/tml/export", payload)  # Export TML
-
-            if isinstance(res, list):
-                for item in res:
-                    filename = item.get("info", {}).get("filename", "").lower()
-                    if filename == "alerts.tml":
-                        return "Alert Found"
-        except requests.exceptions.RequestException as e:
-            print(f"[Error] Failed to inspect {guid}: {e}")
-            continue  # Skip to next dependent if error
-
+def get_alerts_for_batch(guids):
+    try:
+        has_alert = cached_call(  # Cache only the boolean, not the TML
+            ts, 'metadata/tml/export:alerts', guids,
+            lambda: tml_has_alert(export_tml_with_associated(ts, guids)),  # One export for the whole batch
+            args.cache_ttl
+        )
+    except requests.exceptions.RequestException as e:
+        if len(guids) > 1:
+            half = len(guids) // 2  # One bad object fails the whole export, split to isolate it
+            return {**get_alerts_for_batch(guids[:half]), **get_alerts_for_batch(guids[half:])}
+        print(f"[Error] Failed to inspect {guids[0]}: {e}")  # Log failure
+        return {guids[0]: None}  # Unknown, never treat as alert-free
+    if not has_alert or len(guids) == 1:
+        return dict.fromkeys(guids, has_alert)
+    half = len(guids) // 2  # The bundled alerts.tml names no object, split to find which ones have it
+    alerts = {**get_alerts_for_batch(guids[:half]), **get_alerts_for_batch(guids[half:])}
+    if True not in alerts.values():
+        return dict.fromkeys(guids, True)  # Halves disagree with the batch, blame all of it rather than lose the alert
+    return alerts  # Return {dependent GUID: True, False or None when the check failed}
+
+
+def get_alerts_for_dependents(dependent_lists):
+    unique_guids = sorted(set(chain.from_iterable(dependent_lists)))  # Export each unique GUID once
+    alerts_by_guid = {}
+    for alerts in executor.map(get_alerts_for_batch, chunked(unique_guids, TML_EXPORT_BATCH_SIZE)):  # Batches run concurrently
+        alerts_by_guid.update(alerts)
+    return alerts_by_guid
+
+
+def check_alerts_on_dependents(dependents, alerts_by_guid):
+    statuses = [alerts_by_guid.get(guid) for guid in dependents]
+    if True in statuses:
+        return "Alert Found"
+    if None in statuses:
+        return "Alert Check Failed"  # Keep the model out of Step 7 rather than risk archiving it
     return "No Alerts Found"  # Default if no alerts found
 
 
+# =========================================
+# Step 7: Export models ready for archiving
+# =========================================
+ARCHIVE_SCHEMA = pa.schema([
+    ('Model_ID', pa.string()),
+    ('Name', pa.string()),
+    ('Author', pa.string()),
+    ('Created_ms', pa.int64()),
+    ('Dependent_GUIDs', pa.list_(pa.string())),  # Stays list<string> even when every model in a run has no dependents
+    ('Total_Impressions', pa.int64()),
+    ('Alert_Status', pa.string()),
+    ('Run_Date', pa.string())
+])  # Same types in every run so pd.read_parquet can read the whole archive
+
+
+def export_ready_models(df, archive_dir):
+    run_date = time.strftime('%Y-%m-%d')  # Partition key for this run
+    df.assign(Run_Date=run_date).to_parquet(
+        archive_dir,
+        engine='pyarrow',
+        schema=ARCHIVE_SCHEMA,
+        compression='zstd',
+        index=False,
+        partition_cols=['Run_Date']  # Each run appends a new file under Run_Date=YYYY-MM-DD
+    )
+    print(f"Wrote {len(df)} model(s) to {os.path.join(archive_dir, f'Run_Date={run_date}')}\n")
+
 # =========================================
 # Step 8: Preview permissions of a sample model
 # =========================================
@@ -168,10 +185,10 @@ def fetch_sample_permissions(guid):
 
         if not isinstance(res, dict):
             print("[Warning] Unexpected permissions format:")
-            print(json.dumps(res, indent=2))
+            print(orjson.dumps(res, option=orjson.OPT_INDENT_2).decode())
             return
 
-        print(json.dumps(res, indent=2))  # Pretty-print JSON
+        print(orjson.dumps(res, option=orjson.OPT_INDENT_2).decode())  # Pretty-print JSON
 
         print("=========================================\n")
 
@@ -206,7 +223,7 @@ def export_tml_for_sample_guid(guid):
 
         if not isinstance(res, list):
             print("[Warning] Unexpected export format.")
-            print(json.dumps(res, indent=2))
+            print(orjson.dumps(res, option=orjson.OPT_INDENT_2).decode())
             return
 
         for item in res:
@@ -215,9 +232,9 @@ def export_tml_for_sample_guid(guid):
             print(f"📄 File: {filename}")
             print("-----------------------------------------")
             try:
-                parsed = json.loads(tml)
-                print(json.dumps(parsed, indent=2))
-            except json.JSONDecodeError:
+                parsed = orjson.loads(tml)
+                print(orjson.dumps(parsed, option=orjson.OPT_INDENT_2).decode())
+            except orjson.JSONDecodeError:
                 print(tml)  # fallback if not valid JSON
             print("=========================================\n")
 
@@ -228,31 +245,31 @@ def export_tml_for_sample_guid(guid):
 # MAIN EXECUTION FLOW
 # =========================================
 print("=========================================")
-print("1) All fetched models:")
-all_models = get_all_models()  # Call function to get all models
-print(all_models, "\n")
+print(f"1) Models fetched from the catalog (oldest first, read until a whole page is newer than the {args.days} day cutoff):")
+cutoff_ms = age_cutoff_ms(args.days)
+all_models = get_all_models(ts, cache_ttl=args.cache_ttl, executor=executor, created_before_ms=cutoff_ms)  # Fetch models, stopping early only if the server sorted them
+print(with_created_dt(all_models), "\n")
 
 print("=========================================")
 print(f"2) Models NOT created in the last {args.days} days:")
-old_models = filter_old_models(all_models, args.days)  # Filter by age
-print(old_models, "\n")
+old_models = filter_old_models(all_models, cutoff_ms)  # Exact age filter, also drops models without a creation time
+print(with_created_dt(old_models), "\n")
 
 print("=========================================")
 print(f"3) list of Models and there Dependents :")
-models_with_dependencies = []
-for _, model in old_models.iterrows():
-    deps = get_dependents(model['Model_ID'])  # Get dependents for each model
-    models_with_dependencies.append({**model, 'Dependent_GUIDs': deps})  # Add dependents to row
-models_with_dependencies_df = pd.DataFrame(models_with_dependencies)  # Convert to DataFrame
+dependents_by_model, impressions_by_guid = get_dependents_and_impressions(old_models['Model_ID'].tolist(), args.lookback_days)  # Pipeline dependents into impressions
+resolved = old_models['Model_ID'].isin(list(dependents_by_model))  # Models whose dependents lookup succeeded
+if not resolved.all():
+    unresolved_ids = old_models.loc[~resolved, 'Model_ID'].tolist()
+    print(f"[Warning] Could not look up dependents for {len(unresolved_ids)} model(s), excluding them from Steps 4-7: {unresolved_ids}")  # Never treat them as unused
+models_with_dependencies_df = old_models[resolved].assign(Dependent_GUIDs=old_models.loc[resolved, 'Model_ID'].map(dependents_by_model))  # Add dependents column-wise
 print(models_with_dependencies_df[['Name', 'Model_ID', 'Dependent_GUIDs']], "\n")
 
 print("=========================================")
 print(f"4) Activity on dependent Liveboards or Answers in the last {args.lookback_days} days):")
-with_impressions = []
-for _, row in models_with_dependencies_df.iterrows():
-    imps = get_total_impressions(row['Dependent_GUIDs'], args.lookback_days)  # Get impression count
-    with_impressions.append({**row, 'Total_Impressions': imps})  # Append to list
-with_imps_df = pd.DataFrame(with_impressions)  # Convert to DataFrame
+with_imps_df = models_with_dependencies_df.assign(
+    Total_Impressions=[get_total_impressions(deps, impressions_by_guid) for deps in models_with_dependencies_df['Dependent_GUIDs']]
+)  # Add impression counts column-wise
 print(with_imps_df[['Name', 'Model_ID', 'Dependent_GUIDs', 'Total_Impressions']], "\n")
 
 print("=========================================")
@@ -262,7 +279,8 @@ print(filtered[['Name', 'Model_ID', 'Dependent_GUIDs', 'Total_Impressions']], "\
 
 print("=========================================")
 print("6) Active alerts on any dependencies?")
-filtered['Alert_Status'] = filtered.apply(check_alerts_on_dependents, axis=1)  # Add alert check result
+alerts_by_guid = get_alerts_for_dependents(filtered['Dependent_GUIDs'])  # Shared dependents are exported once
+filtered['Alert_Status'] = [check_alerts_on_dependents(deps, alerts_by_guid) for deps in filtered['Dependent_GUIDs']]
 print(filtered[['Name', 'Model_ID', 'Total_Impressions', 'Alert_Status']], "\n")
 
 print("=========================================")
@@ -270,6 +288,9 @@ print("7) Models ready for archiving:")
 ready = filtered[filtered['Alert_Status'] == "No Alerts Found"]  # Filter final models
 print(ready[['Name', 'Model_ID', 'Total_Impressions', 'Alert_Status']], "\n")
 
+if args.archive_dir:
+    export_ready_models(ready, args.archive_dir)  # Columnar archive of this run's results
+
 # Preview sample permissions for hardcoded GUID
 if SAMPLE_GUID:
     fetch_sample_permissions(SAMPLE_GUID)  # Call Step 8
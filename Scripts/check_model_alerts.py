@@ -1,72 +1,26 @@
-import os
 import argparse
-import json
-import requests
-from dotenv import load_dotenv
-from thoughtspot_rest_api_v1 import TSRestApiV2
+import requests.exceptions
+from ts_client import authenticate, export_tml_with_associated, get_dependents, tml_has_alert
 
 # --- Argument Parsing ---
 parser = argparse.ArgumentParser(description="Check if any dependents of a model have alerts")
 parser.add_argument('--model-guid', required=True, help='GUID of the model (LOGICAL_TABLE) to inspect')
 parser.add_argument('--env-file', type=str, default='.env', help='Path to .env file')
+parser.add_argument('--cache-ttl', type=int, default=300, help='Seconds to reuse cached API responses, 0 disables (default: 300)')
 args = parser.parse_args()
 
-# --- Load Environment Variables ---
-load_dotenv(args.env_file)
-USERNAME = os.getenv('TS_USERNAME')
-PASSWORD = os.getenv('TS_PASSWORD')
-SERVER_URL = os.getenv('TS_SERVER_URL')
-
 # --- Authenticate with ThoughtSpot ---
-ts = TSRestApiV2(server_url=SERVER_URL)
-print(f"\nAuthenticating to {SERVER_URL} as {USERNAME}...")
-auth = ts.auth_token_full(username=USERNAME, password=PASSWORD)
-ts.bearer_token = auth['token']
-print("Authenticated.\n")
+print(f"\nAuthenticating with settings from {args.env_file}...")
+ts = authenticate(args.env_file)
+print(f"Authenticated to {ts.server}.\n")
 
 # --- Step 1: Fetch Dependent Objects ---
-def fetch_dependents(ts, model_guid, max_deps=1000):
-    search_request = {
-        'dependent_object_version': 'V1',
-        'include_auto_created_objects': False,
-        'include_dependent_objects': True,
-        'dependent_objects_record_size': max_deps,
-        'include_headers': True,
-        'include_details': False,
-        'record_offset': 0,
-        'record_size': 1,
-        'metadata': [{'type': 'LOGICAL_TABLE', 'identifier': model_guid}]
-    }
-    response = ts.metadata_search(request=search_request)
-    if not response:
-        raise ValueError(f"No metadata found for model {model_guid}")
-    deps_map = response[0].get('dependent_objects', {}).get(model_guid, {})
-    return [hdr for headers in deps_map.values() for hdr in headers]
+# See get_dependents in ts_client.py
 
 # --- Step 2: Inspect each dependent for alerts ---
 def dependent_has_alert(ts, dep_guid):
-    export_payload = {
-        "metadata": [{"identifier": dep_guid}],
-        "export_associated": True,
-        "export_fqn": False,
-        "edoc_format": "JSON",
-        "export_schema_version": "DEFAULT",
-        "export_dependent": False,
-        "export_connection_as_dependent": False,
-        "all_orgs_override": False
-    }
-
     try:
-        result = ts.post_request(
-            endpoint="/metadata/tml/export",
-            request=export_payload
-        )
-
-        for item in result:
-            filename = item.get("info", {}).get("filename", "").lower()
-            if filename == "alerts.tml":
-                return True
-        return False
+        return tml_has_alert(export_tml_with_associated(ts, [dep_guid]))
 
     except requests.exceptions.RequestException as e:
         print(f"⚠️ Error inspecting dependent {dep_guid}: {e}")
@@ -74,7 +28,7 @@ def dependent_has_alert(ts, dep_guid):
 
 # --- Main Execution ---
 try:
-    dependents = fetch_dependents(ts, args.model_guid)
+    dependents = get_dependents(ts, args.model_guid, cache_ttl=args.cache_ttl)
     print(f"\n🔍 Found {len(dependents)} dependents.\n")
 
     found_alert = False
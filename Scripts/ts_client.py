@@ -0,0 +1,419 @@
+# =========================================
+# Shared ThoughtSpot client helpers used by the archiving scripts
+# =========================================
+import hashlib  # For hashing request payloads into cache keys
+import os  # For accessing environment variables and file paths
+import sys  # For exiting when settings are missing or authentication fails
+import threading  # For sharing the rate limiter between worker threads
+import time  # For token expiry and cache entry age
+from collections import deque  # For the window of prefetched model pages
+from concurrent.futures import Future  # For sharing one in-flight call between threads
+from itertools import chain  # For flattening dependents grouped by type
+from operator import itemgetter  # For pulling GUID/impressions pairs out of result rows
+import orjson  # Fast JSON encoding/decoding for API payloads
+import pandas as pd  # For handling tabular data
+import requests.exceptions  # To handle HTTP request exceptions
+from dotenv import load_dotenv  # For loading environment variables from a .env file
+from requests_toolbelt.adapters.socket_options import TCPKeepAliveAdapter  # Keep-alive adapter used by TSRestApiV2
+from thoughtspot_rest_api_v1 import TSRestApiV2  # ThoughtSpot REST API v2 client
+from urllib3.util.retry import Retry  # For retrying throttled or unavailable responses
+
+CACHE_DIR = '.ts_cache'  # Directory holding cached API responses
+TOKEN_FILE_NAME = '.ts_token.json'  # Token cache shared by the scripts next to the .env file
+TOKEN_VALIDITY_SEC = 3600  # Lifetime requested for new bearer tokens
+MODELS_PAGE_SIZE = 5000  # Models requested per metadata search page
+DEPENDENTS_BATCH_SIZE = 100  # Max model identifiers sent in one metadata search
+DEPENDENTS_RECORD_SIZE = 5000  # Max dependents returned per model, too low a cap undercounts impressions
+IMPRESSIONS_BATCH_SIZE = 500  # Max dependent GUIDs placed in one search IN-list
+TML_EXPORT_BATCH_SIZE = 50  # Max objects exported together in one TML export call
+
+memory_cache = {}  # Responses already loaded during this run
+inflight = {}  # Futures for calls currently being fetched, keyed like the cache
+inflight_lock = threading.Lock()
+token_lock = threading.Lock()  # One login at a time when several requests see an expired token
+
+
+def chunked(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]  # Split a list into fixed-size batches
+
+# =========================================
+# HTTP connection pooling and rate limiting
+# =========================================
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate  # Tokens added per second
+        self.capacity = capacity  # Largest burst allowed
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)  # Refill since last call
+            self.updated = now
+            self.tokens -= 1  # Reserve a token, going negative books a future slot
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)  # Sleep outside the lock so other threads can queue up
+
+
+class RateLimitedAdapter(TCPKeepAliveAdapter):
+    def __init__(self, limiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.limiter:
+            self.limiter.acquire()  # Wait for a token before each request leaves
+        return super().send(request, **kwargs)
+
+
+def configure_session(ts, max_rate=40, max_workers=10, relogin=None):
+    rate_limiter = TokenBucket(max_rate, capacity=max(1, max_rate)) if max_rate > 0 else None  # Shared across all API calls
+    ts.set_tcp_keep_alive_adaptor(RateLimitedAdapter(
+        rate_limiter,
+        idle=120, count=20, interval=30,  # Same keep-alive settings as TSRestApiV2's default adaptor
+        pool_connections=32,  # Reuse connections across all worker threads
+        pool_maxsize=max(64, max_workers),  # Never block workers waiting on the pool
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.2,
+            backoff_max=30,  # Cap exponential backoff; Retry-After headers are honored first
+            backoff_jitter=1.0,  # Spread retries from concurrent workers so they don't hit the server together
+            status_forcelist=[429, 502, 503, 504],  # Retry throttled or briefly unavailable responses
+            allowed_methods=None,  # Every POST used here is a read-only query, so retrying is safe
+            raise_on_status=False  # Let raise_for_status report the final response
+        )
+    ))  # Pool and reuse TLS connections for every API call
+
+    def send(url, request):
+        if request is not None:
+            return ts.requests_session.post(url=url, data=orjson.dumps(request), headers={'Content-Type': 'application/json'})  # Encode with orjson
+        return ts.requests_session.post(url=url)
+
+    def post_request(endpoint, request=None):
+        url = ts.base_url + endpoint
+        token = ts.bearer_token  # Token this request is sent with
+        response = send(url, request)
+        if response.status_code == 401 and relogin:
+            relogin(token)  # Token expired mid-run, log in again and retry once
+            response = send(url, request)
+        response.raise_for_status()
+        try:
+            return orjson.loads(response.content)  # Decode raw bytes with orjson
+        except orjson.JSONDecodeError:
+            return True  # Same as TSRestApiV2 for empty (e.g. 204) responses
+
+    ts.post_request = post_request  # metadata_search/searchdata and all direct calls go through post_request
+
+# =========================================
+# Authenticate with ThoughtSpot
+# =========================================
+def get_bearer_token(ts, username, password, token_file):
+    try:
+        with open(token_file, 'rb') as f:
+            cached = orjson.loads(f.read())
+        if cached.get('server') == ts.server and cached.get('username') == username and cached.get('exp', 0) > time.time() + TOKEN_VALIDITY_SEC / 2:
+            return cached['token']  # Reuse a token only while more than half its validity is left, enough for a full run
+    except (OSError, ValueError):
+        pass  # No usable cached token, log in instead
+    token = ts.auth_token_full(username=username, password=password, validity_time_in_sec=TOKEN_VALIDITY_SEC)  # Authenticate and get token
+    exp = token.get('expiration_time_in_millis', (time.time() + TOKEN_VALIDITY_SEC) * 1000) / 1000  # Token expiry in epoch seconds
+    fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)  # Only the owner may read the token
+    with os.fdopen(fd, 'wb') as f:
+        f.write(orjson.dumps({'server': ts.server, 'username': username, 'token': token['token'], 'exp': exp}))
+    os.chmod(token_file, 0o600)  # Tighten permissions on a pre-existing file too
+    return token['token']
+
+
+def authenticate(env_file, max_rate=40, max_workers=10, required_env=()):
+    load_dotenv(dotenv_path=env_file)  # Load environment variables from the given .env file
+    missing = [name for name in ('TS_USERNAME', 'TS_PASSWORD', 'TS_SERVER_URL', *required_env) if not os.getenv(name)]
+    if missing:
+        sys.exit(f"Missing required settings in {env_file} or the environment: {', '.join(missing)}")  # Fail before any API work
+    username = os.getenv('TS_USERNAME')  # Get the ThoughtSpot username
+    password = os.getenv('TS_PASSWORD')  # Get the ThoughtSpot password
+    server_url = os.getenv('TS_SERVER_URL')  # Get the ThoughtSpot server URL
+
+    token_file = os.path.join(os.path.dirname(os.path.abspath(env_file)), TOKEN_FILE_NAME)
+
+    def relogin(stale_token):
+        with token_lock:
+            if ts.bearer_token != stale_token:
+                return  # Another thread already logged in again
+            try:
+                os.remove(token_file)  # Never reuse the rejected token
+            except FileNotFoundError:
+                pass
+            ts.bearer_token = get_bearer_token(ts, username, password, token_file)
+
+    ts = TSRestApiV2(server_url=server_url)  # Create a ThoughtSpot API client instance
+    configure_session(ts, max_rate=max_rate, max_workers=max_workers, relogin=relogin)
+    try:
+        ts.bearer_token = get_bearer_token(ts, username, password, token_file)  # Set the bearer token for future requests
+    except requests.exceptions.HTTPError as e:  # If authentication fails...
+        print("Authentication failed:", e.response.content)  # Print error message
+        sys.exit(1)  # Exit the script
+    return ts
+
+# =========================================
+# Response cache (in-process + on disk) and in-flight call sharing
+# =========================================
+def coalesced(key, fetch):
+    with inflight_lock:
+        future = inflight.get(key)
+        owner = future is None
+        if owner:
+            future = inflight[key] = Future()
+    if not owner:
+        return future.result()  # Wait for the identical call already in flight
+    try:
+        value = fetch()
+        future.set_result(value)
+        return value
+    except BaseException as e:
+        future.set_exception(e)  # Waiters see the same error
+        raise
+    finally:
+        with inflight_lock:
+            del inflight[key]
+
+
+def cache_key(ts, endpoint, payload):
+    key_source = orjson.dumps([ts.server, endpoint, payload], option=orjson.OPT_SORT_KEYS)  # Canonicalize the request
+    return hashlib.blake2b(key_source, digest_size=16).hexdigest()  # Hash into a short cache key
+
+
+def cache_get(key, ttl):
+    now = time.time()
+    entry = memory_cache.get(key)
+    if entry and now - entry[0] < ttl:  # Fresh in-process hit
+        return True, entry[1]
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    try:
+        if now - os.path.getmtime(path) < ttl:  # Fresh on-disk hit
+            with open(path, 'rb') as f:
+                value = orjson.loads(f.read())
+            memory_cache[key] = (os.path.getmtime(path), value)
+            return True, value
+    except (OSError, ValueError):
+        pass  # Missing or unreadable entry, fetch instead
+    return False, None
+
+
+def cache_put(key, value):
+    memory_cache[key] = (time.time(), value)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(value))
+    os.replace(tmp_path, path)  # Swap in atomically so readers never see partial files
+
+
+def cached_call(ts, endpoint, payload, fetch, ttl):
+    key = cache_key(ts, endpoint, payload)
+    if ttl <= 0:  # Caching disabled, still share identical concurrent calls
+        return coalesced(key, fetch)
+    hit, value = cache_get(key, ttl)
+    if hit:
+        return value
+
+    def fetch_and_store():
+        value = fetch()  # Call ThoughtSpot on a miss
+        cache_put(key, value)
+        return value
+
+    return coalesced(key, fetch_and_store)
+
+
+def metadata_search(ts, request, cache_ttl=0):
+    return cached_call(ts, 'metadata/search', request, lambda: ts.metadata_search(request=request), cache_ttl)  # Cached metadata search
+
+# =========================================
+# Models and their dependents
+# =========================================
+def models_page(ts, offset, page_size, cache_ttl=0):
+    request = {
+        'metadata': [{'type': 'LOGICAL_TABLE'}],  # Request all logical table metadata
+        'include_headers': True,  # Id, name, author and created all come from the header
+        'include_details': False,  # Skip the full model definitions, they are never read
+        'sort_options': {'field_name': 'CREATED', 'order': 'ASC'},  # Oldest first, so callers can stop at an age cutoff
+        'record_offset': offset,
+        'record_size': page_size  # Fetch one page at a time
+    }
+    return metadata_search(ts, request, cache_ttl)  # Send the metadata search request
+
+
+def iter_model_pages(ts, page_size=MODELS_PAGE_SIZE, cache_ttl=0, executor=None, prefetch=4):
+    if executor is None:
+        offset = 0  # Start from the first record
+        while True:
+            page = models_page(ts, offset, page_size, cache_ttl)
+            yield page  # Hand each page out as it arrives
+            if len(page) < page_size:  # A short page means we reached the end
+                break
+            offset += page_size
+        return
+    pending = deque([executor.submit(models_page, ts, 0, page_size, cache_ttl)])  # Pages requested ahead of the one being consumed, in offset order
+    next_offset = page_size
+    window = 1  # A single request until the catalog proves bigger than one page
+    try:
+        while pending:
+            page = pending.popleft().result()
+            yield page  # Pages are still yielded in order
+            if len(page) < page_size:  # End of catalog
+                break
+            window = min(max(1, prefetch), window * 2)  # Widen the read-ahead after each full page
+            while len(pending) < window:
+                pending.append(executor.submit(models_page, ts, next_offset, page_size, cache_ttl))
+                next_offset += page_size
+    finally:
+        for future in pending:
+            future.cancel()  # Drop pages requested past the end or past where the caller stopped
+
+
+def get_all_models(ts, cache_ttl=0, executor=None, created_before_ms=None):
+    ids, names, authors, created = [], [], [], []  # Column lists for model info
+    previous = None  # Last creation time seen, to verify the server honoured the CREATED sort
+    ordered = True
+    for page in iter_model_pages(ts, cache_ttl=cache_ttl, executor=executor):  # Stream models page by page
+        page_created = []
+        for model in page:
+            meta = model.get('metadata_header', {})  # Get metadata header
+            ids.append(meta.get('id'))  # Store model GUID
+            names.append(meta.get('name'))  # Store model name
+            authors.append(meta.get('authorDisplayName'))  # Store model author's name
+            created.append(meta.get('created'))  # Store model creation time in milliseconds
+            page_created.append(meta.get('created'))
+            if meta.get('created') is not None:
+                if previous is not None and meta['created'] < previous:
+                    ordered = False  # Sort not honoured, read the whole catalog
+                previous = meta['created']
+        if (created_before_ms is not None and ordered and page_created
+                and all(c is not None and c >= created_before_ms for c in page_created)):
+            break  # A whole page past the cutoff in a verified oldest-first order, every later model is newer
+    df = pd.DataFrame({
+        'Model_ID': pd.array(ids, dtype='string[pyarrow]'),  # Arrow-backed strings instead of boxed Python objects
+        'Name': pd.array(names, dtype='string[pyarrow]'),
+        'Author': pd.array(authors, dtype='string[pyarrow]'),  # Plain strings, a categorical's code width changes with the author count
+        'Created_ms': pd.array(created, dtype='Int64')  # Nullable int64 keeps missing timestamps as NA
+    })  # Build DataFrame column-wise
+    return df  # Return the DataFrame
+
+
+def with_created_dt(df):
+    return df.assign(Created_dt=pd.to_datetime(df['Created_ms'], unit='ms', errors='coerce', cache=True, utc=True))  # Readable creation time for printing only
+
+
+def get_dependents_bulk(ts, model_ids, max_deps=DEPENDENTS_RECORD_SIZE, cache_ttl=0):
+    dependents_by_model = {}  # Only models found on the server get an entry, callers must not assume [] for the rest
+    for batch in chunked(model_ids, DEPENDENTS_BATCH_SIZE):
+        request = {
+            'metadata': [{'type': 'LOGICAL_TABLE', 'identifier': mid} for mid in batch],  # Specify all model IDs at once
+            'dependent_object_version': 'V1',
+            'include_auto_created_objects': False,
+            'include_dependent_objects': True,  # Include dependent objects
+            'dependent_objects_record_size': max_deps,  # Max dependents returned per model
+            'include_headers': True,  # Include headers
+            'include_details': False,
+            'record_offset': 0,
+            'record_size': len(batch)
+        }
+        try:
+            res = metadata_search(ts, request, cache_ttl)  # Make the request
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code != 400:
+                raise
+            if len(batch) == 1:
+                continue  # Unknown or inaccessible model, no entry so callers see it as unresolved
+            half = len(batch) // 2  # One bad identifier fails the whole search, split to isolate it
+            dependents_by_model.update(get_dependents_bulk(ts, batch[:half], max_deps, cache_ttl))
+            dependents_by_model.update(get_dependents_bulk(ts, batch[half:], max_deps, cache_ttl))
+            continue
+        for entry in res or []:
+            model_id = entry.get('metadata_id') or entry.get('metadata_header', {}).get('id')
+            deps_map = entry.get('dependent_objects', {}).get(model_id, {})  # Dependents are keyed by model GUID
+            dependents_by_model[model_id] = list(chain.from_iterable(deps_map.values()))  # Flatten dependent headers in C
+    return dependents_by_model  # Return {model GUID: [dependent headers]}
+
+
+def get_dependents(ts, model_id, max_deps=DEPENDENTS_RECORD_SIZE, cache_ttl=0):
+    dependents_by_model = get_dependents_bulk(ts, [model_id], max_deps=max_deps, cache_ttl=cache_ttl)
+    if model_id not in dependents_by_model:
+        raise ValueError(f"No metadata found for model {model_id}")
+    return dependents_by_model[model_id]  # Return [dependent headers]
+
+# =========================================
+# Impressions on dependent objects
+# =========================================
+IMPRESSIONS_QUERY = "[Answer Book GUID] in {{'{guids}'}} [Answer Book GUID] count [Impressions] [Timestamp].'last {days} days'"  # Shared query shape
+
+
+def search_impressions(ts, guids, days_window, logical_table_id):
+    request = {
+        'query_string': IMPRESSIONS_QUERY.format(guids="','".join(guids), days=days_window),  # One query grouped by dependent GUID
+        'logical_table_identifier': logical_table_id,  # Use the impressions table
+        'data_format': 'COMPACT',
+        'record_offset': 0,
+        'record_size': len(guids)
+    }
+    impressions = dict.fromkeys(guids, 0)  # GUIDs with no rows had no activity
+    try:
+        result = ts.searchdata(request=request)  # Execute the query
+    except requests.exceptions.HTTPError as e:
+        if len(guids) < 2 or e.response is None or e.response.status_code not in (400, 413, 414):
+            raise
+        half = len(guids) // 2  # Query string too long for the server, split the IN-list and retry
+        impressions.update(search_impressions(ts, guids[:half], days_window, logical_table_id))
+        impressions.update(search_impressions(ts, guids[half:], days_window, logical_table_id))
+        return impressions
+    contents = result.get('contents', [])  # Get result contents
+    if contents and contents[0].get('data_rows'):  # If data exists
+        columns = contents[0]['column_names']
+        pick = itemgetter(columns.index('Answer Book GUID'), columns.index('Number of Impressions'))  # Column indexes looked up once per response
+        impressions.update(map(pick, contents[0]['data_rows']))  # Record impressions per GUID
+    return impressions  # Return {dependent GUID: impressions}
+
+
+def search_impressions_cached(ts, guids, days_window, logical_table_id, cache_ttl=0):
+    if cache_ttl <= 0:  # Caching disabled
+        return search_impressions(ts, guids, days_window, logical_table_id)
+    keys = {guid: cache_key(ts, 'searchdata:impressions', [logical_table_id, days_window, guid]) for guid in guids}  # One entry per GUID so shared dependents hit across models and runs
+    impressions, missing = {}, []
+    for guid, key in keys.items():
+        hit, value = cache_get(key, cache_ttl)
+        if hit:
+            impressions[guid] = value
+        else:
+            missing.append(guid)
+    if missing:
+        fetched = search_impressions(ts, missing, days_window, logical_table_id)  # Only query GUIDs not cached
+        for guid in missing:
+            cache_put(keys[guid], fetched[guid])
+        impressions.update(fetched)
+    return impressions  # Return {dependent GUID: impressions}
+
+# =========================================
+# Alerts on dependent objects
+# =========================================
+def export_tml_with_associated(ts, guids):
+    payload = {
+        "metadata": [{"identifier": guid} for guid in guids],  # The endpoint accepts several objects per call
+        "export_associated": True,  # Alerts come back as associated files
+        "export_fqn": False,
+        "edoc_format": "JSON",
+        "export_schema_version": "DEFAULT",
+        "export_dependent": False,
+        "export_connection_as_dependent": False,
+        "all_orgs_override": False
+    }
+    return ts.post_request("/metadata/tml/export", payload)  # Export TML
+
+
+def tml_has_alert(items):
+    if not isinstance(items, list):
+        return False
+    return any((item.get("info", {}).get("filename") or "").lower() == "alerts.tml" for item in items)  # Any casing, stops at the first alerts file